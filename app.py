@@ -4,10 +4,21 @@ from data_loader import DataLoader
 from mail_generation import MailGenerator
 from email_sender import EmailSender
 import asyncio
+import csv
+import hashlib
+import hmac
 import json
-import os
+import threading
+import time
+from io import BytesIO, StringIO
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional, fall back to pandas' CSV writer
+    pa = None
+
 # Set page config
 st.set_page_config(
     page_title="Mail Merge Application",
@@ -15,90 +26,155 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize session state for login
-if 'authenticated' not in st.session_state:
-    st.session_state.authenticated = False
-if 'login_attempts' not in st.session_state:
-    st.session_state.login_attempts = 0
+@st.cache_resource
+def get_email_sender() -> EmailSender:
+    """Create the EmailSender once and share it across all sessions."""
+    return EmailSender()
+
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Start one long-lived event loop in a background thread for async email sending.
+    
+    Uses uvloop when it is installed (Linux/macOS only), otherwise the default asyncio loop.
+    """
+    try:
+        import uvloop
+        loop = uvloop.new_event_loop()
+    except ImportError:
+        loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def hash_upload(uploaded_file) -> bytes:
+    """Hash an uploaded file in 1 MiB chunks, without copying its whole contents."""
+    digest = hashlib.blake2b(digest_size=16)
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(1 << 20), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.digest()
+
+@st.cache_data(show_spinner=False)
+def parse_upload(content_hash: bytes, file_name: str, _uploaded_file) -> pd.DataFrame:
+    """Parse an uploaded file, memoized on its content hash so reruns skip re-parsing.
+    
+    The leading underscore keeps Streamlit from hashing the file object itself.
+    """
+    return DataLoader().load_file(_uploaded_file, file_name)
+
+def is_csv_text_compatible(dtype) -> bool:
+    """Check whether Arrow writes values of an Arrow type as the same CSV text as DataFrame.to_csv."""
+    # Arrow writes booleans as true/false, timestamps with microseconds and 1.0 as 1
+    return pa.types.is_string(dtype) or pa.types.is_large_string(dtype) or pa.types.is_integer(dtype) or pa.types.is_null(dtype)
+
+@st.cache_data(show_spinner=False)
+def df_to_csv(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to CSV bytes, memoized so unchanged DataFrames are not re-serialized on rerun."""
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, ValueError):
+            # Columns Arrow cannot convert (e.g. mixed-type object columns) or duplicate column names
+            table = None
+        if table is not None and all(is_csv_text_compatible(dtype) for dtype in table.schema.types):
+            # Write the header the way pandas does, since Arrow quotes every column name
+            header = StringIO()
+            csv.writer(header, lineterminator='\n').writerow(table.column_names)
+            buffer = pa.BufferOutputStream()
+            buffer.write(header.getvalue().encode())
+            pa_csv.write_csv(table, buffer, pa_csv.WriteOptions(include_header=False))
+            return buffer.getvalue().to_pybytes()
+    # Write straight into a bytes buffer rather than building a str and encoding it
+    buffer = BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+# Session state defaults; callables are factories invoked only when the key is missing
+SESSION_DEFAULTS = {
+    'authenticated': False,
+    'login_attempts': 0,
+    'mail_generator': MailGenerator,
+    'email_sender': get_email_sender,
+    'df': None,
+    'df_stats': None,
+    'generated_emails': None,
+    'sending_results': None,
+    'email_preview': None,
+    'emails_ready': False,
+}
+
+# Initialize session state
+for key, default in SESSION_DEFAULTS.items():
+    if key not in st.session_state:
+        st.session_state[key] = default() if callable(default) else default
+
+# SHA-256 digests of the login credentials
+STORED_USER_HASH = bytes.fromhex("34ed06ae6e9ace3cac40646e66ada3b5d124f1fd8e712d78f78a47fe0f8687b8")
+STORED_PW_HASH = bytes.fromhex("6644b9b3736362eff074c465725bc7840b1540bf54c914d97108ac6d2dd3076a")
 
 # Login function
 def check_credentials(username: str, password: str) -> bool:
-    """Check if the provided credentials are valid."""
-    return username == "rajs02073@gmail.com" and password == "rajsingh7222"
+    """Check if the provided credentials are valid using constant-time digest comparison."""
+    user_ok = hmac.compare_digest(hashlib.sha256(username.encode()).digest(), STORED_USER_HASH)
+    password_ok = hmac.compare_digest(hashlib.sha256(password.encode()).digest(), STORED_PW_HASH)
+    # Bitwise & so both comparisons always run
+    return user_ok & password_ok
 
 # Login page
 if not st.session_state.authenticated:
-    st.title("🔐 Login")
+    login_page = st.empty()
+    with login_page.container():
+        st.title("🔐 Login")
     
-    # Create a centered container for the login form
-    col1, col2, col3 = st.columns([1,2,1])
-    with col2:
-        with st.form("login_form"):
-            st.subheader("Please Login")
-            username = st.text_input("Email", type="default")
-            password = st.text_input("Password", type="password")
-            login_button = st.form_submit_button("Login")
+        # Create a centered container for the login form
+        col1, col2, col3 = st.columns([1,2,1])
+        with col2:
+            with st.form("login_form"):
+                st.subheader("Please Login")
+                username = st.text_input("Email", type="default")
+                password = st.text_input("Password", type="password")
+                login_button = st.form_submit_button("Login")
             
-            if login_button:
-                if check_credentials(username, password):
-                    st.session_state.authenticated = True
-                    st.session_state.login_attempts = 0
-                    st.success("Login successful!")
-                    st.rerun()
-                else:
-                    st.session_state.login_attempts += 1
-                    if st.session_state.login_attempts >= 3:
-                        st.error("Too many failed attempts. Please try again later.")
-                        st.stop()
+                if login_button:
+                    if check_credentials(username, password):
+                        st.session_state.authenticated = True
+                        st.session_state.login_attempts = 0
+                        st.toast("Login successful!")
                     else:
-                        st.error(f"Invalid credentials. {3 - st.session_state.login_attempts} attempts remaining.")
+                        st.session_state.login_attempts += 1
+                        if st.session_state.login_attempts >= 3:
+                            st.error("Too many failed attempts. Please try again later.")
+                            st.stop()
+                        else:
+                            st.error(f"Invalid credentials. {3 - st.session_state.login_attempts} attempts remaining.")
     
-    # Add some styling
-    st.markdown("""
-        <style>
-        .stForm {
-            background-color: #f0f2f6;
-            padding: 2rem;
-            border-radius: 10px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }
-        </style>
-    """, unsafe_allow_html=True)
-    
-    # Add a logout button in the sidebar if somehow authenticated
+        # Add some styling
+        st.markdown("""
+            <style>
+            .stForm {
+                background-color: #f0f2f6;
+                padding: 2rem;
+                border-radius: 10px;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            }
+            </style>
+        """, unsafe_allow_html=True)
+
+    # On success, clear the login page and fall through to the app in this same run
     if st.session_state.authenticated:
-        if st.sidebar.button("Logout"):
-            st.session_state.authenticated = False
-            st.session_state.login_attempts = 0
-            st.rerun()
+        login_page.empty()
 
 # Main application
 if st.session_state.authenticated:
     # Add logout button to sidebar
     if st.sidebar.button("Logout"):
-        st.session_state.authenticated = False
-        st.session_state.login_attempts = 0
+        # Drop all session data; defaults are restored on the next run
+        st.session_state.clear()
         st.rerun()
     
-    # Initialize other session state variables
-    if 'data_loader' not in st.session_state:
-        st.session_state.data_loader = DataLoader()
-    if 'mail_generator' not in st.session_state:
-        st.session_state.mail_generator = MailGenerator()
-    if 'email_sender' not in st.session_state:
-        st.session_state.email_sender = EmailSender()
-    if 'df' not in st.session_state:
-        st.session_state.df = None
-    if 'generated_emails' not in st.session_state:
-        st.session_state.generated_emails = None
-    if 'sending_results' not in st.session_state:
-        st.session_state.sending_results = None
-    if 'show_preview' not in st.session_state:
-        st.session_state.show_preview = False
-
     def download_csv(df: pd.DataFrame, filename: str):
         """Helper function to create a download button for DataFrames."""
-        csv = df.to_csv(index=False)
+        csv = df_to_csv(df)
         st.download_button(
             label=f"Download {filename} as CSV",
             data=csv,
@@ -106,6 +182,19 @@ if st.session_state.authenticated:
             mime="text/csv"
         )
 
+    def show_df(df: pd.DataFrame, key: str, default_rows: int = 50):
+        """Helper function to display the first rows of a DataFrame, with a slider to show more."""
+        n_rows = len(df)
+        if n_rows > default_rows:
+            n_rows = st.slider(
+                "Rows to display",
+                min_value=min(10, default_rows),
+                max_value=len(df),
+                value=default_rows,
+                key=key
+            )
+        st.dataframe(df.head(n_rows), use_container_width=True)
+
     # Create tabs
     tab1, tab2, tab3 = st.tabs(["📊 Data Loading", "✍️ Email Generation", "📤 Email Sending"])
 
@@ -116,10 +205,7 @@ if st.session_state.authenticated:
         # Show preview of current data if available
         if st.session_state.df is not None:
             st.subheader("Current Data Preview")
-            st.dataframe(
-                st.session_state.df,
-                use_container_width=True
-            )
+            show_df(st.session_state.df, key="current_data_rows")
             download_csv(st.session_state.df, "current_data.csv")
         
         uploaded_file = st.file_uploader(
@@ -130,21 +216,24 @@ if st.session_state.authenticated:
         
         if uploaded_file is not None:
             try:
-                # Save the uploaded file temporarily
-                file_path = f"temp_{uploaded_file.name}"
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getvalue())
-                
-                # Load the file
-                df = st.session_state.data_loader.load_file(file_path)
+                # Load the file straight from the in-memory upload
+                df = parse_upload(hash_upload(uploaded_file), uploaded_file.name, uploaded_file)
                 st.session_state.df = df
                 
+                # Compute statistics once per uploaded file rather than on every rerun
+                stats = st.session_state.df_stats
+                if stats is None or stats["file_id"] != uploaded_file.file_id:
+                    stats = {
+                        "file_id": uploaded_file.file_id,
+                        "n": len(df),
+                        "cols": len(df.columns),
+                        "valid_emails": int(df['email_id'].notna().sum())
+                    }
+                    st.session_state.df_stats = stats
+                
                 # Display the data
                 st.subheader("Preview of Loaded Data")
-                st.dataframe(
-                    df,
-                    use_container_width=True
-                )
+                show_df(df, key="loaded_data_rows")
                 
                 # Download button for loaded data
                 download_csv(df, f"loaded_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
@@ -153,26 +242,21 @@ if st.session_state.authenticated:
                 st.subheader("Data Statistics")
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Total Leads", len(df))
+                    st.metric("Total Leads", stats["n"])
                 with col2:
-                    st.metric("Columns", len(df.columns))
+                    st.metric("Columns", stats["cols"])
                 with col3:
-                    st.metric("Valid Emails", df['email_id'].notna().sum())
+                    st.metric("Valid Emails", stats["valid_emails"])
                 
                 # Display available columns
                 st.subheader("Available Columns for Email Templates")
                 st.write("You can use these column names as placeholders in your email templates using {column_name} format.")
                 st.code(", ".join(df.columns), language="text")
                 
-                # Clean up temporary file
-                os.remove(file_path)
-                
                 st.success("Data loaded successfully! Proceed to the Email Generation tab.")
                 
             except Exception as e:
                 st.error(f"Error loading file: {str(e)}")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
 
     with tab2:
         st.title("Email Generation")
@@ -182,7 +266,7 @@ if st.session_state.authenticated:
         else:
             # Show preview of current data
             with st.expander("View Current Data", expanded=False):
-                st.dataframe(st.session_state.df, use_container_width=True)
+                show_df(st.session_state.df, key="template_data_rows")
                 download_csv(st.session_state.df, "current_data_for_templates.csv")
             
             # Email template input
@@ -198,14 +282,6 @@ if st.session_state.authenticated:
                     help="Use {column_name} for placeholders. Example: 'Dear {name}, I hope this email finds you well...'"
                 )
                 
-                preview_row = st.number_input(
-                    "Preview Row Number",
-                    min_value=0,
-                    max_value=len(st.session_state.df) - 1,
-                    value=0,
-                    help="Select a row number to preview the generated email"
-                )
-                
                 submitted = st.form_submit_button("Generate Emails")
             
             # Handle form submission outside the form
@@ -215,53 +291,62 @@ if st.session_state.authenticated:
                     st.session_state.mail_generator.set_dataframe(st.session_state.df)
                     st.session_state.mail_generator.set_templates(subject_template, body_template)
                     
-                    # Generate emails
-                    generated_df = st.session_state.mail_generator.generate_emails()
-                    st.session_state.generated_emails = generated_df
-                    st.session_state.show_preview = True
-                    
-                    # Preview
-                    preview = st.session_state.mail_generator.preview_email(preview_row)
-                    
-                    st.subheader("Email Preview")
-                    st.write("**Subject:**")
-                    st.write(preview['subject'])
-                    st.write("**Body:**")
-                    st.write(preview['body'])
+                    # Render only the preview rows; the full set is generated on demand
+                    st.session_state.email_preview = st.session_state.mail_generator.generate_preview()
+                    st.session_state.generated_emails = None
+                    st.session_state.emails_ready = True
                     
                     st.success("Emails generated successfully! Proceed to the Email Sending tab.")
                     
                 except Exception as e:
+                    st.session_state.emails_ready = False
                     st.error(f"Error generating emails: {str(e)}")
             
             # Show preview and download options outside the form
-            if st.session_state.show_preview and st.session_state.generated_emails is not None:
+            if st.session_state.emails_ready:
+                # Outside the form so changing the row reruns right away; rows already viewed
+                # come from MailGenerator's preview cache
+                preview_row = st.number_input(
+                    "Preview Row Number",
+                    min_value=0,
+                    max_value=len(st.session_state.mail_generator.df) - 1,
+                    value=0,
+                    help="Select a row number to preview the generated email"
+                )
+                preview = st.session_state.mail_generator.preview_email(preview_row)
+                
+                st.subheader("Email Preview")
+                st.write("**Subject:**")
+                st.write(preview['subject'])
+                st.write("**Body:**")
+                st.write(preview['body'])
+                
                 st.subheader("Preview of Generated Emails")
-                preview_df = st.session_state.generated_emails[['email_id', 'email_subject', 'email_body']].head()
+                preview_df = st.session_state.email_preview[['email_id', 'email_subject', 'email_body']]
                 st.dataframe(preview_df, use_container_width=True)
-                download_csv(st.session_state.generated_emails, f"generated_emails_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
-            
-            # Show preview of previously generated emails if available
-            elif st.session_state.generated_emails is not None:
-                st.subheader("Previously Generated Emails")
-                preview_df = st.session_state.generated_emails[['email_id', 'email_subject', 'email_body']].head()
-                st.dataframe(preview_df, use_container_width=True)
-                download_csv(st.session_state.generated_emails, "previously_generated_emails.csv")
+                
+                if st.session_state.generated_emails is None:
+                    if st.button("Generate All Emails for Download", key="generate_all_button"):
+                        st.session_state.generated_emails = st.session_state.mail_generator.generate_all()
+                
+                if st.session_state.generated_emails is not None:
+                    download_csv(st.session_state.generated_emails, f"generated_emails_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
 
     with tab3:
         st.title("Email Sending")
         
-        if st.session_state.generated_emails is None:
+        if not st.session_state.emails_ready:
             st.warning("Please generate emails first in the Email Generation tab.")
         else:
             # Show preview of emails to be sent
             with st.expander("Preview Emails to be Sent", expanded=False):
-                preview_df = st.session_state.generated_emails[['email_id', 'email_subject', 'email_body']].head()
+                preview_df = st.session_state.email_preview[['email_id', 'email_subject', 'email_body']]
                 st.dataframe(preview_df, use_container_width=True)
-                download_csv(st.session_state.generated_emails, "emails_to_send.csv")
+                if st.session_state.generated_emails is not None:
+                    download_csv(st.session_state.generated_emails, "emails_to_send.csv")
             
-            # Display sending status
-            status = st.session_state.email_sender.get_sending_status(st.session_state.generated_emails)
+            # Display sending status from the lead data; emails are rendered when sending starts
+            status = st.session_state.email_sender.get_sending_status(st.session_state.mail_generator.df)
             
             st.subheader("Sending Status")
             col1, col2, col3, col4 = st.columns(4)
@@ -277,6 +362,24 @@ if st.session_state.authenticated:
             # Sending controls
             st.subheader("Send Emails")
             
+            col1, col2 = st.columns(2)
+            with col1:
+                max_in_flight = st.number_input(
+                    "Concurrent Batches",
+                    min_value=1,
+                    max_value=st.session_state.email_sender.max_connections,
+                    value=st.session_state.email_sender.max_in_flight,
+                    help="Maximum number of batches sent at the same time"
+                )
+            with col2:
+                rate_limit = st.number_input(
+                    "Rate Limit (emails per second)",
+                    min_value=0,
+                    max_value=1000,
+                    value=0,
+                    help="Maximum number of emails dispatched per second. 0 sends as fast as possible."
+                )
+            
             # Use a unique key for the send button
             send_button = st.button("Start Sending", key="send_emails_button", disabled=status['ready_to_send'] == 0)
             
@@ -286,16 +389,47 @@ if st.session_state.authenticated:
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    # Send emails
-                    async def send_emails():
-                        results = await st.session_state.email_sender.send_emails(st.session_state.generated_emails)
-                        st.session_state.sending_results = results
-                        return results
+                    # Render every email now that the user has committed to sending
+                    if st.session_state.generated_emails is None:
+                        st.session_state.generated_emails = st.session_state.mail_generator.generate_all()
+                    
+                    # Only hand sendable rows to the sender
+                    generated = st.session_state.generated_emails
+                    valid_mask = (
+                        generated['email_id'].notna()
+                        & generated['email_subject'].str.len().gt(0)
+                        & generated['email_body'].notna()
+                    )
+                    valid_emails = generated.loc[valid_mask].reset_index(drop=True)
+                    
+                    # Written from the sender's loop thread, read here while polling
+                    progress = {"processed": 0, "total": 0}
+                    
+                    def on_progress(processed: int, total: int):
+                        progress["processed"] = processed
+                        progress["total"] = total
+                    
+                    # Send emails on the shared loop so the sender's HTTP session survives between sends
+                    future = asyncio.run_coroutine_threadsafe(
+                        st.session_state.email_sender.send_emails(
+                            valid_emails,
+                            progress_cb=on_progress,
+                            rate_limit_per_sec=rate_limit or None,
+                            max_in_flight=int(max_in_flight)
+                        ),
+                        get_event_loop()
+                    )
+                    
+                    # Update progress while the sender runs
+                    while not future.done():
+                        if progress["total"]:
+                            progress_bar.progress(progress["processed"] / progress["total"])
+                            status_text.text(f"Processed {progress['processed']} of {progress['total']} emails...")
+                        time.sleep(0.1)
                     
-                    # Run the async function
-                    results = asyncio.run(send_emails())
+                    results = future.result()
+                    st.session_state.sending_results = results
                     
-                    # Update progress
                     progress_bar.progress(1.0)
                     status_text.text("Sending completed!")
                     
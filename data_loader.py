@@ -1,6 +1,26 @@
 import pandas as pd
-from typing import Union, Optional
+from typing import IO, Union, Optional
 import os
+import re
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pa_compute
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional, fall back to pandas' C parser
+    pa = None
+
+# Columns every uploaded lead file must have; add more required columns if needed
+REQUIRED_COLUMNS = frozenset({'email_id'})
+
+# pandas' default missing-value markers, so both CSV parsers agree on what is missing
+CSV_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+# Basic email format check
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
 class DataLoader:
     def __init__(self):
@@ -8,12 +28,15 @@ class DataLoader:
         self.file_path: Optional[str] = None
         self.file_type: Optional[str] = None
 
-    def load_file(self, file_path: str) -> pd.DataFrame:
+    def load_file(self, source: Union[str, IO[bytes]], file_name: Optional[str] = None) -> pd.DataFrame:
         """
         Load a CSV or Excel file into a pandas DataFrame.
         
         Args:
-            file_path (str): Path to the CSV or Excel file
+            source (Union[str, IO[bytes]]): Path to the file, or a file-like object
+                such as a Streamlit UploadedFile
+            file_name (Optional[str]): Name used to detect the file type when
+                source is a file-like object without a name attribute
             
         Returns:
             pd.DataFrame: Loaded DataFrame
@@ -21,31 +44,131 @@ class DataLoader:
         Raises:
             ValueError: If file type is not supported or file doesn't exist
         """
-        if not os.path.exists(file_path):
-            raise ValueError(f"File not found: {file_path}")
+        if isinstance(source, str):
+            if not os.path.exists(source):
+                raise ValueError(f"File not found: {source}")
+            file_name = file_name or source
+        else:
+            file_name = file_name or getattr(source, 'name', '')
+            source.seek(0)
             
-        self.file_path = file_path
-        self.file_type = os.path.splitext(file_path)[1].lower()
+        self.file_path = file_name
+        self.file_type = os.path.splitext(file_name)[1].lower()
         
         try:
             if self.file_type == '.csv':
-                self.df = pd.read_csv(file_path)
+                self.df = self._read_csv(source)
             elif self.file_type in ['.xlsx', '.xls']:
-                self.df = pd.read_excel(file_path)
+                self.df = self._read_excel(source)
             else:
                 raise ValueError(f"Unsupported file type: {self.file_type}. Please use CSV or Excel files.")
             
             # Validate required columns
-            required_columns = ['email_id']  # Add more required columns if needed
-            missing_columns = [col for col in required_columns if col not in self.df.columns]
+            missing_columns = REQUIRED_COLUMNS - set(self.df.columns)
             if missing_columns:
-                raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+                raise ValueError(f"Missing required columns: {', '.join(sorted(missing_columns))}")
             
             return self.df
             
         except Exception as e:
             raise ValueError(f"Error loading file: {str(e)}")
     
+    def _read_csv(self, source: Union[str, IO[bytes]]) -> pd.DataFrame:
+        """
+        Read a CSV with the multithreaded pyarrow parser, falling back to the C parser.
+        
+        Args:
+            source (Union[str, IO[bytes]]): Path to the CSV file or a file-like object
+            
+        Returns:
+            pd.DataFrame: Parsed DataFrame
+        """
+        if pa is not None:
+            df = self._read_csv_arrow(source)
+            if df is not None:
+                return df
+            if not isinstance(source, str):
+                source.seek(0)
+        return pd.read_csv(source, engine='c', low_memory=False, cache_dates=True)
+    
+    def _read_csv_arrow(self, source: Union[str, IO[bytes]]) -> Optional[pd.DataFrame]:
+        """
+        Read a CSV with pyarrow, giving up wherever the result could differ from the C parser's.
+        
+        Merge fields render cell values as they were parsed, so Arrow's type inference
+        must not change them:
+        - Columns Arrow infers as dates, times or timestamps are re-read as strings,
+          since the C parser keeps that text as written.
+        - Files with duplicate column names need pandas' renaming (name, name.1).
+        - Columns Arrow reads as floats holding only whole numbers may be integers
+          the C parser keeps exact, e.g. beyond int64 or written as +6.
+        The last two fall back to the C parser by returning None.
+        
+        Args:
+            source (Union[str, IO[bytes]]): Path to the CSV file or a file-like object
+            
+        Returns:
+            Optional[pd.DataFrame]: Parsed DataFrame, or None if the C parser must be used
+        """
+        # Read uploads into one Arrow buffer so a second pass needs no seek on the upload
+        data = source if isinstance(source, str) else pa.py_buffer(source.read())
+        open_input = (lambda: data) if isinstance(data, str) else (lambda: pa.BufferReader(data))
+        
+        # Quoted fields may span lines, e.g. multi-line email bodies; Arrow assumes they
+        # don't by default and can split such rows in two without raising
+        parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+        # Match the C parser's missing and boolean values; Arrow's defaults miss None and
+        # <NA>, and also read 1/0 as booleans. Empty fields are missing in string columns too
+        convert_options = pa_csv.ConvertOptions(
+            null_values=CSV_NA_VALUES,
+            true_values=['True', 'TRUE', 'true'],
+            false_values=['False', 'FALSE', 'false'],
+            strings_can_be_null=True
+        )
+        try:
+            table = pa_csv.read_csv(open_input(), parse_options=parse_options, convert_options=convert_options)
+            if len(set(table.column_names)) < table.num_columns:
+                return None
+            for field, column in zip(table.schema, table.columns):
+                if pa.types.is_floating(field.type) and pa_compute.all(pa_compute.equal(column, pa_compute.floor(column))).as_py():
+                    return None
+            
+            temporal_columns = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+            if temporal_columns:
+                convert_options.column_types = {name: pa.string() for name in temporal_columns}
+                table = pa_csv.read_csv(open_input(), parse_options=parse_options, convert_options=convert_options)
+        except pa.ArrowInvalid:
+            # Arrow could not parse the file, retry with the more lenient C parser
+            return None
+        
+        # Arrow represents missing values in object and all-empty columns as None, where the
+        # C parser gives NaN
+        df = table.to_pandas()
+        for field in table.schema:
+            if pa.types.is_null(field.type):
+                df[field.name] = df[field.name].astype('float64')
+            elif df[field.name].dtype == object:
+                df[field.name] = df[field.name].where(df[field.name].notna())
+        return df
+    
+    def _read_excel(self, source: Union[str, IO[bytes]]) -> pd.DataFrame:
+        """
+        Read an Excel file with the Rust-based calamine parser, falling back to pandas' default engine.
+        
+        Args:
+            source (Union[str, IO[bytes]]): Path to the Excel file or a file-like object
+            
+        Returns:
+            pd.DataFrame: Parsed DataFrame
+        """
+        try:
+            return pd.read_excel(source, engine='calamine')
+        except (ImportError, ValueError):
+            # python-calamine is not installed or could not parse the file
+            if not isinstance(source, str):
+                source.seek(0)
+            return pd.read_excel(source)
+    
     def get_dataframe(self) -> Optional[pd.DataFrame]:
         """
         Get the current DataFrame.
@@ -81,12 +204,10 @@ class DataLoader:
             return False
             
         # Check for empty email addresses
-        if self.df['email_id'].isnull().any():
-            return False
-            
-        # Check for valid email format (basic validation)
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not self.df['email_id'].str.match(email_pattern).all():
+        emails = self.df['email_id']
+        if emails.isna().any():
             return False
             
-        return True
+        # Check for valid email format (basic validation), stopping at the first invalid address
+        match = EMAIL_RE.match
+        return all(isinstance(email, str) and match(email) for email in emails.to_numpy(dtype=object))
@@ -1,68 +1,213 @@
 import aiohttp
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 import json
 from datetime import datetime
 import os
 import pandas as pd
 import logging
+import random
+import tempfile
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib json module
+    orjson = None
+
+
+def _dump_json(obj: Any, indent: bool = False) -> bytes:
+    """Serialize obj to JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(obj, indent=2 if indent else None).encode()
+
+
+def _describe_error(error: BaseException) -> str:
+    """Describe an exception for the error log, even when its message is empty."""
+    # Timeouts are raised without a message, which would show up as a blank error
+    if isinstance(error, asyncio.TimeoutError) and not str(error):
+        return "Request to the send API timed out"
+    return str(error) or repr(error)
+
+
+# Decoder for API responses, matching the encoder above
+_load_json = orjson.loads if orjson is not None else json.loads
+
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Columns a DataFrame of generated emails must have to be sent
+EMAIL_COLUMNS = frozenset({'email_id', 'email_subject', 'email_body'})
+
+# Upper bound in seconds on the backoff between retries of a failed batch
+MAX_RETRY_DELAY = 30
+
+# Sending is not idempotent: a batch is only resent when the server provably did not act
+# on it. These statuses mean it was turned away before being processed
+RETRY_STATUSES = frozenset({429, 503})
+
+# Errors raised before any of the request reached the server. aiohttp only tells connect
+# timeouts apart from read timeouts from 3.10, so older versions don't retry connect timeouts
+NOT_SENT_ERRORS = (aiohttp.ClientConnectorError,) + (
+    (aiohttp.ConnectionTimeoutError,) if hasattr(aiohttp, 'ConnectionTimeoutError') else ()
+)
 
 class EmailSender:
-    def __init__(self, batch_size: int = 5):
+    def __init__(
+        self,
+        batch_size: int = 5,
+        max_connections: int = 200,
+        max_in_flight: int = 50,
+        timeout: float = 300,
+        max_retries: int = 3,
+        retry_delay: float = 1
+    ):
         self.api_endpoint = "https://smtp-rajs.onrender.com/send-emails"
         self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        # Bound connection setup and idle reads separately so a stalled response fails fast, with
+        # no overall cap: a cold-started send API can take minutes before it answers at all
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=10, sock_connect=10, sock_read=timeout)
         self.results_dir = "email_results"
         self.logger = logging.getLogger(__name__)
+        # Reused across send_emails calls so connections stay warm between sends
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
         
         # Create results directory if it doesn't exist
-        if not os.path.exists(self.results_dir):
-            os.makedirs(self.results_dir)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared HTTP session, creating it on first use.
+        
+        A ClientSession is bound to the event loop it was created on, so a new one
+        is created if the caller runs on a different loop. The session it replaces
+        is closed on its own loop so its pooled sockets are not leaked.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._close_stale_session()
+            # aiohttp's default cap of 100 sockets would silently queue requests beyond it
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                ttl_dns_cache=300,
+                keepalive_timeout=75
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._session_loop = loop
+        return self._session
+
+    def _close_stale_session(self) -> None:
+        """Close the current session on the loop that owns it, if that loop is still running."""
+        session, loop = self._session, self._session_loop
+        self._session = None
+        self._session_loop = None
+        # The session can only be closed from its own loop; a loop that has stopped
+        # can't run the close, and its sockets go when that loop is closed
+        if session is not None and not session.closed and loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+
+    def _backoff(self, attempt: int) -> float:
+        """Get a capped exponential delay with jitter before retry number attempt + 1."""
+        # Jitter spreads out batches that failed together so they don't retry in lockstep
+        return min(MAX_RETRY_DELAY, self.retry_delay * (2 ** attempt)) * (0.5 + random.random())
 
     async def send_email_batch(self, session: aiohttp.ClientSession, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Send a batch of emails concurrently."""
+        """
+        Send a batch of emails, retrying with backoff only when it was certainly not sent.
+        
+        The endpoint sends mail as a side effect, so a batch is only resent after a
+        connection failure or a 429/503 response. Read timeouts, other errors and
+        any response the server did act on are final, even if the response body
+        can't be decoded.
+        """
+        data = _dump_json(batch)
+        for attempt in range(self.max_retries + 1):
+            retries_left = attempt < self.max_retries
+            try:
+                response = await session.post(self.api_endpoint, data=data, headers=JSON_HEADERS)
+            except NOT_SENT_ERRORS as e:
+                if not retries_left:
+                    self.logger.error(f"Error sending batch: {_describe_error(e)}")
+                    return [{"error": _describe_error(e), "status_code": 500}]
+                self.logger.warning(f"Retrying batch after error: {_describe_error(e)}")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except Exception as e:
+                self.logger.error(f"Error sending batch: {_describe_error(e)}")
+                return [{"error": _describe_error(e), "status_code": 500}]
+            
+            async with response:
+                if response.status not in RETRY_STATUSES or not retries_left:
+                    return await self._read_batch_response(response)
+                self.logger.warning(f"Retrying batch after {response.status}")
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def _read_batch_response(self, response: aiohttp.ClientResponse) -> List[Dict[str, Any]]:
+        """
+        Read the server's answer to a batch without raising, so the batch is never resent.
+        
+        Args:
+            response (aiohttp.ClientResponse): Response to the batch's POST
+            
+        Returns:
+            List[Dict[str, Any]]: Per-email results, or a single error entry
+        """
         try:
-            async with session.post(self.api_endpoint, json=batch) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result
-                else:
-                    error_text = await response.text()
-                    self.logger.error(f"Failed to send batch: {error_text}")
-                    return [{"error": f"Failed to send batch: {error_text}", "status_code": response.status}]
+            if response.status == 200:
+                return await response.json(loads=_load_json)
+            error_text = await response.text()
         except Exception as e:
-            self.logger.error(f"Error sending batch: {str(e)}")
-            return [{"error": str(e), "status_code": 500}]
+            self.logger.error(f"Unreadable response to batch: {_describe_error(e)}")
+            return [{"error": f"Unreadable response from the send API: {_describe_error(e)}", "status_code": response.status}]
+        self.logger.error(f"Failed to send batch: {error_text}")
+        return [{"error": f"Failed to send batch: {error_text}", "status_code": response.status}]
 
-    async def send_emails(self, df: pd.DataFrame) -> Dict[str, Any]:
+    async def send_emails(
+        self,
+        df: pd.DataFrame,
+        progress_cb: Optional[Callable[[int, int], None]] = None,
+        rate_limit_per_sec: Optional[float] = None,
+        max_in_flight: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Send emails using the DataFrame containing generated emails.
         
         Args:
             df (pd.DataFrame): DataFrame containing 'email_id', 'email_subject', and 'email_body' columns
+            progress_cb (Optional[Callable[[int, int], None]]): Called with (processed, total)
+                as each batch finishes
+            rate_limit_per_sec (Optional[float]): Maximum number of emails to dispatch per second
+            max_in_flight (Optional[int]): Maximum number of batches in flight at once,
+                defaults to self.max_in_flight
             
         Returns:
             Dict[str, Any]: Results of the email sending operation
         """
-        if not all(col in df.columns for col in ['email_id', 'email_subject', 'email_body']):
+        if not EMAIL_COLUMNS.issubset(df.columns):
             raise ValueError("DataFrame must contain 'email_id', 'email_subject', and 'email_body' columns")
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Prepare email payloads
-        email_payloads = []
-        for _, row in df.iterrows():
-            if pd.isna(row['email_id']) or pd.isna(row['email_subject']) or pd.isna(row['email_body']):
-                continue
-                
-            email_payloads.append({
-                "email": [row['email_id']],  # API expects a list of emails
-                "subject": row['email_subject'],
-                "body": row['email_body']
-            })
-        
-        # Create batches
-        batches = [email_payloads[i:i + self.batch_size] 
-                  for i in range(0, len(email_payloads), self.batch_size)]
+        # Prepare email payloads, dropping incomplete rows with one vectorized mask
+        mask = df[['email_id', 'email_subject', 'email_body']].notna().all(axis=1).to_numpy()
+        email_payloads = [
+            {
+                "email": [email_id],  # API expects a list of emails
+                "subject": subject,
+                "body": body
+            }
+            for email_id, subject, body in zip(
+                df['email_id'].to_numpy()[mask],
+                df['email_subject'].to_numpy()[mask],
+                df['email_body'].to_numpy()[mask]
+            )
+        ]
         
         # Track results
         results = {
@@ -74,51 +219,105 @@ class EmailSender:
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                # Create tasks for all batches
-                tasks = [self.send_email_batch(session, batch) for batch in batches]
-                
-                # Execute all tasks concurrently and collect results
-                batch_results = await asyncio.gather(*tasks)
-                
-                # Process results
-                for batch_result in batch_results:
-                    for result in batch_result:
-                        if "error" in result:
-                            results["failed"] += 1
-                            results["errors"].append(result["error"])
-                        else:
-                            results["successful"] += 1
+            session = await self._get_session()
+            semaphore = asyncio.Semaphore(max_in_flight or self.max_in_flight)
+            processed = 0
+            
+            async def run_batch(batch: List[Dict[str, Any]]) -> None:
+                nonlocal processed
+                try:
+                    batch_results = await self.send_email_batch(session, batch)
+                    errors = [result["error"] for result in batch_results if "error" in result]
+                    failed = len(errors)
+                    successful = len(batch_results) - failed
+                except Exception as e:
+                    # Finished tasks leave `pending`, so an exception escaping here would never
+                    # be seen; count the whole batch as failed instead, e.g. on a malformed response
+                    self.logger.error(f"Error processing batch: {_describe_error(e)}")
+                    errors = [f"Failed to process batch: {_describe_error(e)}"]
+                    failed = len(batch)
+                    successful = 0
+                finally:
+                    semaphore.release()
                 
-                # Save results to file
-                results_file = os.path.join(self.results_dir, f"email_results_{timestamp}.json")
-                with open(results_file, 'w') as f:
-                    json.dump(results, f, indent=2)
+                # Fold results in as each batch finishes instead of holding them all until the end
+                results["successful"] += successful
+                results["failed"] += failed
+                results["errors"].extend(errors)
                 
-                return results
+                processed += len(batch)
+                if progress_cb is not None:
+                    progress_cb(processed, len(email_payloads))
+            
+            # Slice each batch only once a slot is free, so at most max_in_flight
+            # batches and tasks exist at any time
+            pending = set()
+            for start in range(0, len(email_payloads), self.batch_size):
+                await semaphore.acquire()
+                batch = email_payloads[start:start + self.batch_size]
+                task = asyncio.create_task(run_batch(batch))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                if rate_limit_per_sec:
+                    await asyncio.sleep(len(batch) / rate_limit_per_sec)
+            
+            # Wait for the batches still in flight
+            await asyncio.gather(*pending)
+            
+            # Save results to file in a worker thread so the shared event loop is not blocked on disk
+            results_file = os.path.join(self.results_dir, f"email_results_{timestamp}.json")
+            await asyncio.to_thread(self._write_results, results_file, results)
+            
+            return results
                 
         except Exception as e:
-            self.logger.error(f"Error in send_emails: {str(e)}")
-            results["errors"].append(str(e))
+            self.logger.error(f"Error in send_emails: {_describe_error(e)}")
+            results["errors"].append(_describe_error(e))
             return results
 
+    def _write_results(self, results_file: str, results: Dict[str, Any]) -> None:
+        """
+        Atomically write the results of a send to disk.
+        
+        Args:
+            results_file (str): Destination path
+            results (Dict[str, Any]): Results of the email sending operation
+        """
+        # A unique temp file, since sends from different sessions can finish in the same second
+        fd, tmp_file = tempfile.mkstemp(dir=self.results_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_dump_json(results, indent=True))
+            os.replace(tmp_file, results_file)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
     def get_sending_status(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
         Get statistics about the email sending status.
         
+        Emails are rendered lazily, so the DataFrame may not have 'email_subject'
+        and 'email_body' columns yet. In that case every lead with an email address
+        is counted as having a subject and body, since that is exactly the set of
+        rows MailGenerator renders.
+        
         Args:
             df (pd.DataFrame): DataFrame containing email data
             
         Returns:
             Dict[str, Any]: Statistics about the email sending status
         """
-        if not all(col in df.columns for col in ['email_id', 'email_subject', 'email_body']):
-            raise ValueError("DataFrame must contain 'email_id', 'email_subject', and 'email_body' columns")
+        if 'email_id' not in df.columns:
+            raise ValueError("DataFrame must contain an 'email_id' column")
             
         total = len(df)
         valid_emails = df['email_id'].notna().sum()
-        valid_subjects = df['email_subject'].notna().sum()
-        valid_bodies = df['email_body'].notna().sum()
+        if 'email_subject' in df.columns and 'email_body' in df.columns:
+            valid_subjects = df['email_subject'].notna().sum()
+            valid_bodies = df['email_body'].notna().sum()
+        else:
+            valid_subjects = valid_bodies = valid_emails
         
         return {
             "total_leads": total,
@@ -131,20 +330,22 @@ class EmailSender:
 def prepare_email_payloads(generated_emails: List[Dict[str, Any]], enriched_data: pd.DataFrame = None) -> List[Dict[str, Any]]:
     """Convert generated emails into the format required by the API."""
     payloads = []
+    if enriched_data is None:
+        return payloads
+    
+    # Index emails by lead_id once, keeping the first row for duplicate leads
+    email_by_lead: Dict[Any, Any] = {}
+    for lead_id, email in zip(enriched_data['lead_id'], enriched_data['email']):
+        email_by_lead.setdefault(lead_id, email)
     
     for result in generated_emails:
         if result["status"] == "success" and result["final_result"]:
             # Get lead_id and find email from enriched data
             lead_id = result.get("lead_id")
-            if not lead_id or enriched_data is None:
-                continue
-                
-            # Get email from enriched data
-            lead_data = enriched_data[enriched_data['lead_id'] == lead_id]
-            if lead_data.empty:
+            if not lead_id or lead_id not in email_by_lead:
                 continue
                 
-            email = lead_data['email'].iloc[0]
+            email = email_by_lead[lead_id]
             subject = result["final_result"].get("subject", "")
             body = result["final_result"].get("body", "")
             
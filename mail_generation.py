@@ -1,6 +1,18 @@
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, List
-import re
+from typing import Any, Callable, Optional, Dict, List, Tuple
+import string
+import functools
+
+# A compiled template: (literal_text, column_name, format_spec, conversion) tokens, where
+# column_name is None for literal text with no placeholder after it
+TemplateProgram = List[Tuple[str, Optional[str], str, Optional[str]]]
+
+# Renders one row of a template from its placeholder values, passed positionally in template order
+RowFormatter = Callable[..., str]
+
+# Placeholder conversions supported by str.format ('!s', '!r', '!a')
+_CONVERSIONS = frozenset({None, 's', 'r', 'a'})
 
 class MailGenerator:
     def __init__(self):
@@ -8,6 +20,14 @@ class MailGenerator:
         self.subject_template: Optional[str] = None
         self.body_template: Optional[str] = None
         self.placeholders: List[str] = []
+        self._subject_program: TemplateProgram = []
+        self._body_program: TemplateProgram = []
+        self._subject_formatter: Optional[RowFormatter] = None
+        self._body_formatter: Optional[RowFormatter] = None
+        # Columns referenced by either template, collected once when the templates are set
+        self._required_columns: frozenset = frozenset()
+        # Per-instance preview cache so scrubbing through rows does not re-render them
+        self._render_row = functools.lru_cache(maxsize=256)(self._render_row_uncached)
 
     def set_dataframe(self, df: pd.DataFrame) -> None:
         """
@@ -18,6 +38,7 @@ class MailGenerator:
         """
         self.df = df.copy()
         self._extract_placeholders()
+        self._render_row.cache_clear()
 
     def _extract_placeholders(self) -> None:
         """Extract all possible placeholders from the DataFrame columns."""
@@ -31,9 +52,167 @@ class MailGenerator:
         Args:
             subject_template (str): Template for email subject
             body_template (str): Template for email body
+            
+        Raises:
+            ValueError: If a template is malformed, or a DataFrame is set and a
+                template references columns it does not have
         """
+        subject_program = self._compile_template(subject_template)
+        body_program = self._compile_template(body_template)
+        required_columns = frozenset(self._fields(subject_program) + self._fields(body_program))
+        
+        # Fail fast on unknown placeholders instead of at generation time
+        if self.df is not None:
+            missing_columns = required_columns - set(self.placeholders)
+            if missing_columns:
+                raise ValueError(f"Unknown placeholders in templates: {', '.join(sorted(missing_columns))}")
+        
         self.subject_template = subject_template
         self.body_template = body_template
+        self._subject_program = subject_program
+        self._body_program = body_program
+        self._required_columns = required_columns
+        self._subject_formatter = self._compile_formatter(self._subject_program)
+        self._body_formatter = self._compile_formatter(self._body_program)
+        self._render_row.cache_clear()
+
+    @staticmethod
+    def _compile_template(template: str) -> TemplateProgram:
+        """
+        Parse a template once into literal text and placeholder tokens.
+        
+        Args:
+            template (str): Template using {column_name} placeholders, optionally with
+                a conversion and format spec such as {price:.2f}
+            
+        Returns:
+            TemplateProgram: Interleaved literal/column tokens
+            
+        Raises:
+            ValueError: If the template is malformed or uses an unknown conversion
+        """
+        program = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            if conversion not in _CONVERSIONS:
+                raise ValueError(f"Unknown conversion '!{conversion}' in template.")
+            program.append((literal, field, spec or '', conversion))
+        return program
+
+    @staticmethod
+    def _fields(program: TemplateProgram) -> List[str]:
+        """Get the columns referenced by a compiled template, in order."""
+        return [field for _, field, _, _ in program if field is not None]
+
+    @staticmethod
+    def _is_plain(program: TemplateProgram) -> bool:
+        """Check whether every placeholder in a compiled template is a bare {column_name}."""
+        return all(not spec and conversion is None for _, _, spec, conversion in program)
+
+    @staticmethod
+    def _compile_formatter(program: TemplateProgram) -> RowFormatter:
+        """
+        Generate a Python function specialized to a template for rendering single rows.
+        
+        The template is turned into the source of a function taking one positional
+        argument per placeholder and returning an f-string, then compiled with exec.
+        Rendering a row is then a single BUILD_STRING with no template parsing.
+        User text only ever appears inside a repr()'d string literal, and format
+        specs are passed through the function's namespace, so template content
+        cannot inject code.
+        
+        Args:
+            program (TemplateProgram): Compiled template tokens
+            
+        Returns:
+            RowFormatter: Function taking the placeholder values in template order
+        """
+        namespace: Dict[str, Any] = {}
+        params = []
+        pieces = []
+        for literal, field, spec, conversion in program:
+            pieces.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field is None:
+                continue
+            
+            param = f"v{len(params)}"
+            params.append(param)
+            expression = param
+            if conversion is not None:
+                expression += f"!{conversion}"
+            if spec:
+                namespace[f"_spec{len(params)}"] = spec
+                expression += f":{{_spec{len(params)}}}"
+            pieces.append("{" + expression + "}")
+        
+        source = f"def _render({', '.join(params)}):\n    return f{''.join(pieces)!r}\n"
+        exec(source, namespace)
+        return namespace['_render']
+
+    def _render(self, program: TemplateProgram, string_columns: Dict[str, np.ndarray], n_rows: int) -> np.ndarray:
+        """
+        Render a compiled template with whole-column string concatenation.
+        
+        Args:
+            program (TemplateProgram): Compiled template tokens
+            string_columns (Dict[str, np.ndarray]): Referenced columns, already converted to str
+            n_rows (int): Number of rows to render
+            
+        Returns:
+            np.ndarray: Object array of rendered strings
+        """
+        rendered = np.full(n_rows, "", dtype=object)
+        for literal, field, _, _ in program:
+            if literal:
+                rendered = rendered + literal
+            if field is not None:
+                rendered = rendered + string_columns[field]
+        return rendered
+
+    def _render_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add 'email_subject' and 'email_body' columns to the given rows.
+        
+        Leads without an email address are skipped and left as NaN.
+        
+        Args:
+            df (pd.DataFrame): Rows to render, modified in place
+            
+        Returns:
+            pd.DataFrame: The same DataFrame with the rendered columns
+        """
+        mask = df['email_id'].notna().to_numpy()
+        rows = df.loc[mask]
+        
+        # Convert each bare placeholder column to str once, shared by subject and body. Values are
+        # formatted exactly as the per-row formatter does, since Series.astype(str) renders some
+        # dtypes differently (midnight datetimes lose their time) and previews must match the send
+        fields = {
+            field
+            for program in (self._subject_program, self._body_program) if self._is_plain(program)
+            for field in self._fields(program)
+        }
+        string_columns = {
+            field: np.array([format(value, '') for value in rows[field].to_numpy(dtype=object)], dtype=object)
+            for field in fields
+        }
+        
+        templates = (
+            ('email_subject', self._subject_program, self._subject_formatter),
+            ('email_body', self._body_program, self._body_formatter)
+        )
+        for column, program, formatter in templates:
+            result = pd.Series(np.nan, index=df.index, dtype=object)
+            if not self._fields(program):
+                # Templates without placeholders render to the same text for every row
+                result.loc[mask] = "".join(literal for literal, _, _, _ in program)
+            elif self._is_plain(program):
+                result.loc[mask] = self._render(program, string_columns, len(rows))
+            else:
+                # Format specs and conversions need the raw values, one row at a time
+                values = [rows[field].to_numpy(dtype=object) for field in self._fields(program)]
+                result.loc[mask] = [formatter(*row) for row in zip(*values)]
+            df[column] = result
+        return df
 
     def _validate_templates(self) -> bool:
         """
@@ -45,24 +224,13 @@ class MailGenerator:
         if not self.subject_template or not self.body_template:
             return False
 
-        # Find all placeholders in templates
-        pattern = r'\{([^}]+)\}'
-        subject_placeholders = re.findall(pattern, self.subject_template)
-        body_placeholders = re.findall(pattern, self.body_template)
-        
         # Check if all placeholders exist in DataFrame columns
-        all_placeholders = set(subject_placeholders + body_placeholders)
-        missing_placeholders = [p for p in all_placeholders if p not in self.placeholders]
-        
-        return len(missing_placeholders) == 0
+        return self._required_columns.issubset(self.placeholders)
 
-    def generate_emails(self) -> pd.DataFrame:
+    def _check_ready(self) -> None:
         """
-        Generate personalized emails for all leads.
+        Check that a DataFrame and valid templates are set before rendering.
         
-        Returns:
-            pd.DataFrame: DataFrame with added 'email_subject' and 'email_body' columns
-            
         Raises:
             ValueError: If templates are not set or invalid
         """
@@ -71,19 +239,35 @@ class MailGenerator:
             
         if not self._validate_templates():
             raise ValueError("Invalid templates. Please check that all placeholders exist in the DataFrame.")
-            
-        # Create copies of the templates for each row
-        self.df['email_subject'] = self.df.apply(
-            lambda row: self.subject_template.format(**row.to_dict()),
-            axis=1
-        )
+
+    def generate_preview(self, n: int = 5) -> pd.DataFrame:
+        """
+        Generate personalized emails for the first few leads only.
         
-        self.df['email_body'] = self.df.apply(
-            lambda row: self.body_template.format(**row.to_dict()),
-            axis=1
-        )
+        Args:
+            n (int): Number of leads to render
+            
+        Returns:
+            pd.DataFrame: First n rows with added 'email_subject' and 'email_body' columns
+            
+        Raises:
+            ValueError: If templates are not set or invalid
+        """
+        self._check_ready()
+        return self._render_frame(self.df.head(n).copy())
+
+    def generate_all(self) -> pd.DataFrame:
+        """
+        Generate personalized emails for all leads.
         
-        return self.df
+        Returns:
+            pd.DataFrame: DataFrame with added 'email_subject' and 'email_body' columns
+            
+        Raises:
+            ValueError: If templates are not set or invalid
+        """
+        self._check_ready()
+        return self._render_frame(self.df)
 
     def get_available_placeholders(self) -> List[str]:
         """
@@ -113,8 +297,43 @@ class MailGenerator:
         if not self.subject_template or not self.body_template:
             raise ValueError("Templates not set. Please set templates first.")
             
-        row = self.df.iloc[row_index]
+        return dict(self._render_row(row_index))
+
+    def _render_row_uncached(self, row_index: int) -> Dict[str, str]:
+        """
+        Render the subject and body for a single row.
+        
+        The lru_cache wrapper keys on the row index alone, since set_dataframe
+        and set_templates clear it whenever anything else the result depends on changes.
+        
+        Args:
+            row_index (int): Index of the row to render
+            
+        Returns:
+            Dict[str, str]: Dictionary containing subject and body of the email
+        """
         return {
-            'subject': self.subject_template.format(**row.to_dict()),
-            'body': self.body_template.format(**row.to_dict())
+            'subject': self._render_one(self._subject_program, self._subject_formatter, row_index),
+            'body': self._render_one(self._body_program, self._body_formatter, row_index)
         }
+
+    def _render_one(
+        self,
+        program: TemplateProgram,
+        formatter: RowFormatter,
+        row_index: int
+    ) -> str:
+        """
+        Render one compiled template for a single row.
+        
+        Args:
+            program (TemplateProgram): Compiled template tokens
+            formatter (RowFormatter): Compiled per-row formatter for the template
+            row_index (int): Index of the row to render
+            
+        Returns:
+            str: Rendered text
+        """
+        # Read only the referenced cells instead of materializing the whole row
+        values = tuple(self.df[col].iat[row_index] for col in self._fields(program))
+        return formatter(*values)
@@ -0,0 +1,41 @@
+import io
+import unittest
+
+from data_loader import DataLoader
+
+
+def load_csv(text):
+    return DataLoader().load_file(io.BytesIO(text.encode()), 'leads.csv')
+
+
+class ReadCsvTest(unittest.TestCase):
+    def test_multiline_quoted_values_across_arrow_blocks(self):
+        n_rows = 40000
+        rows = [f'lead{i}@example.com,"Hi {i}, there\nBest, Raj"' for i in range(n_rows)]
+        text = "email_id,email_body\n" + "\n".join(rows) + "\n"
+        # Larger than one Arrow block, so rows are split across parser chunks
+        self.assertGreater(len(text), 1 << 20)
+
+        df = load_csv(text)
+        self.assertEqual(len(df), n_rows)
+        self.assertEqual(df['email_id'].iat[26116], 'lead26116@example.com')
+        self.assertEqual(df['email_body'].iat[26116], 'Hi 26116, there\nBest, Raj')
+        self.assertTrue(df['email_id'].str.endswith('@example.com').all())
+
+
+    def test_duplicate_headers_are_renamed_like_pandas(self):
+        df = load_csv("email_id,name,name\na@example.com,A,B\n")
+        self.assertEqual(list(df.columns), ['email_id', 'name', 'name.1'])
+        self.assertEqual(df['name'].iat[0], 'A')
+
+    def test_integers_beyond_int64_stay_exact(self):
+        df = load_csv("email_id,account\na@example.com,12345678901234567890\nb@example.com,5\n")
+        self.assertEqual([str(value) for value in df['account']], ['12345678901234567890', '5'])
+
+    def test_timestamps_keep_their_text(self):
+        df = load_csv("email_id,when\na@example.com,2024-01-05T10:30:00Z\n")
+        self.assertEqual(df['when'].iat[0], '2024-01-05T10:30:00Z')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from email_sender import EmailSender
+
+
+def make_batches(n_batches, batch_size=5):
+    return [
+        [{"email": [f"lead{b}_{i}@example.com"], "subject": "Hi", "body": "Hello"} for i in range(batch_size)]
+        for b in range(n_batches)
+    ]
+
+
+class SendEmailBatchRetryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # EmailSender creates its results directory in the working directory
+        cwd = os.getcwd()
+        tmp = tempfile.TemporaryDirectory()
+        os.chdir(tmp.name)
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, cwd)
+
+        self.posts = 0
+        self.responses = []
+        app = web.Application()
+        app.router.add_post('/send-emails', self.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.addAsyncCleanup(self.server.close)
+
+        self.sender = EmailSender(retry_delay=0)
+        self.sender.api_endpoint = str(self.server.make_url('/send-emails'))
+        self.session = await self.sender._get_session()
+        self.addAsyncCleanup(self.session.close)
+
+    async def handle(self, request):
+        await request.read()
+        self.posts += 1
+        status, body, content_type = self.responses.pop(0) if self.responses else (200, '[]', 'application/json')
+        return web.Response(status=status, text=body, content_type=content_type)
+
+    async def send(self, batches):
+        return [await self.sender.send_email_batch(self.session, batch) for batch in batches]
+
+    async def test_accepted_batch_with_undecodable_body_is_posted_once(self):
+        self.responses = [(200, '<html>ok</html>', 'text/html')] * 2
+        results = await self.send(make_batches(2))
+        self.assertEqual(self.posts, 2)
+        self.assertTrue(all("error" in batch_results[0] for batch_results in results))
+
+    async def test_server_errors_after_processing_are_not_retried(self):
+        self.responses = [(500, 'boom', 'text/plain'), (502, 'bad gateway', 'text/plain'), (504, 'timeout', 'text/plain')]
+        results = await self.send(make_batches(3))
+        self.assertEqual(self.posts, 3)
+        self.assertEqual([batch_results[0]["status_code"] for batch_results in results], [500, 502, 504])
+
+    async def test_rejected_batch_is_retried(self):
+        self.responses = [(503, 'starting', 'text/plain'), (429, 'slow down', 'text/plain')]
+        results = await self.send(make_batches(1))
+        self.assertEqual(self.posts, 3)
+        self.assertEqual(results, [[]])
+
+
+class WriteResultsTest(unittest.TestCase):
+    def test_concurrent_writes_to_the_same_file_do_not_collide(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sender = EmailSender.__new__(EmailSender)
+            sender.results_dir = tmp
+            results_file = os.path.join(tmp, "email_results_20240101_000000.json")
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                writes = [pool.submit(sender._write_results, results_file, {"run": i}) for i in range(50)]
+                for write in writes:
+                    write.result()
+
+            self.assertEqual(os.listdir(tmp), [os.path.basename(results_file)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mail_generation import MailGenerator
+
+
+class PreviewMatchesSendTest(unittest.TestCase):
+    def test_preview_matches_generated_rows(self):
+        df = pd.DataFrame({
+            'email_id': ['a@example.com', 'b@example.com', 'c@example.com'],
+            'count': [1, 2, 3],
+            'score': [1.5, np.nan, 2.0],
+            'when': pd.to_datetime(['2024-03-01', '2024-03-02', '2024-03-03']),
+        })
+        generator = MailGenerator()
+        generator.set_dataframe(df)
+        generator.set_templates("{count} for {email_id}", "Score {score} on {when}")
+
+        generated = generator.generate_all()
+        for i in range(len(df)):
+            preview = generator.preview_email(i)
+            self.assertEqual(preview['subject'], generated['email_subject'].iat[i])
+            self.assertEqual(preview['body'], generated['email_body'].iat[i])
+
+        self.assertEqual(generated['email_body'].iat[0], "Score 1.5 on 2024-03-01 00:00:00")
+        self.assertEqual(generated['email_body'].iat[1], "Score nan on 2024-03-02 00:00:00")
+
+
+class PreviewCacheTest(unittest.TestCase):
+    def test_revisiting_a_row_reuses_the_cached_render(self):
+        generator = MailGenerator()
+        generator.set_dataframe(pd.DataFrame({'email_id': ['a@example.com', 'b@example.com'], 'name': ['A', 'B']}))
+        generator.set_templates("Hi {name}", "Hello {name}")
+
+        first = generator.preview_email(1)
+        generator.preview_email(0)
+        self.assertEqual(generator.preview_email(1), first)
+        self.assertEqual(generator._render_row.cache_info().hits, 1)
+
+        generator.set_templates("Hey {name}", "Hello {name}")
+        self.assertEqual(generator.preview_email(1)['subject'], "Hey B")
+
+
+if __name__ == '__main__':
+    unittest.main()